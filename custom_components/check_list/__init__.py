@@ -1,19 +1,34 @@
 """Support to manage a check list."""
+from collections import defaultdict
 from http import HTTPStatus
+import json
 import logging
-import uuid
+import os
+from pathlib import Path
+import tempfile
 
+from aiohttp import web
 import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.components import http, websocket_api
 from homeassistant.components.http.data_validator import RequestDataValidator
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
 from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
-from homeassistant.util.json import load_json, save_json
 
 from .const import DOMAIN
 
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:  # pragma: no cover
+
+    def json_dumps(obj):
+        """Encode obj as JSON bytes."""
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    json_loads = json.loads
+
 ATTR_NAME = "name"
 ATTR_TYPE = "type"
 ATTR_COMPLETE = "complete"
@@ -23,6 +38,7 @@ CONFIG_SCHEMA = vol.Schema({DOMAIN: {}}, extra=vol.ALLOW_EXTRA)
 EVENT = "check_list_updated"
 ITEM_UPDATE_SCHEMA = vol.Schema({ATTR_COMPLETE: bool, ATTR_NAME: str, ATTR_TYPE: str})
 PERSISTENCE = ".check_list.json"
+SAVE_DELAY = 0.25
 
 SERVICE_ADD_ITEM = "add_item"
 SERVICE_COMPLETE_ITEM = "complete_item"
@@ -99,14 +115,14 @@ async def async_setup_entry(hass, config_entry):
         type = call.data.get(ATTR_TYPE)
         if name is None:
             return
-        try:
-            item = [item for item in data.items if item["name"] == name][0]
-        except IndexError:
+        item = data.get_item_by_name(name)
+        if item is None:
             _LOGGER.error("Removing of item failed: %s cannot be found", name)
-        else:
-            await data.async_update(
-                item["id"], {"name": name, "type": type, "complete": True}
-            )
+            return
+        info = {"name": name, "complete": True}
+        if type is not None:
+            info["type"] = type
+        await data.async_update_trusted(item["id"], info)
 
     async def clear_complete_service(call):
         """Handle clearing check_list items."""
@@ -122,14 +138,14 @@ async def async_setup_entry(hass, config_entry):
         type = call.data.get(ATTR_TYPE)
         if name is None:
             return
-        try:
-            item = [item for item in data.items if item["name"] == name][0]
-        except IndexError:
+        item = data.get_item_by_name(name)
+        if item is None:
             _LOGGER.error("Restoring of item failed: %s cannot be found", name)
-        else:
-            await data.async_update(
-                item["id"], {"name": name, "type": type, "complete": False}
-            )
+            return
+        info = {"name": name, "complete": False}
+        if type is not None:
+            info["type"] = type
+        await data.async_update_trusted(item["id"], info)
 
     async def complete_all_service(call):
         """Mark all items in the list as complete."""
@@ -141,6 +157,7 @@ async def async_setup_entry(hass, config_entry):
 
     data = hass.data[DOMAIN] = CheckData(hass)
     await data.async_load()
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, data.async_flush)
 
     hass.services.async_register(
         DOMAIN, SERVICE_ADD_ITEM, add_item_service, schema=SERVICE_ITEM_SCHEMA
@@ -215,80 +232,138 @@ class CheckData:
     def __init__(self, hass):
         """Initialize the check list."""
         self.hass = hass
-        self.items = []
+        self._items = []
+        self._snapshot = None
+        self._by_id = {}
+        self._by_name = defaultdict(list)
+        self._version = 0
+        self._json_cache = None
+        self._json_cache_version = None
+        self._frame_suffix = None
+        self._frame_suffix_version = None
+        self._save_handle = None
+        self._save_task = None
+
+    @property
+    def items(self):
+        """Return a tuple of the items, rebuilt only when the list is reshaped.
+
+        The tuple fixes which items there are and their order, the item dicts
+        themselves are shared with the list and see in-place updates.
+        """
+        if self._snapshot is None:
+            self._snapshot = tuple(self._items)
+        return self._snapshot
+
+    @callback
+    def get_item_by_name(self, name):
+        """Return the first item called name, or None."""
+        return (self._by_name.get(name) or [None])[0]
 
     async def async_add(self, name, type):
         """Add a check list item."""
         item = {
             "name": name,
             "type": type,
-            "id": uuid.uuid4().hex,
+            "id": os.urandom(16).hex(),
             "complete": False,
-            "index": len(self.items),
+            "index": len(self._items),
         }
-        self.items.append(item)
-        await self.hass.async_add_executor_job(self.save)
+        self._items.append(item)
+        self._by_id[item["id"]] = item
+        self._by_name[name].append(item)
+        self._invalidate(reshaped=True)
+        self._schedule_save()
         self.hass.bus.async_fire(EVENT, {"action": "add", "item": item})
         return item
 
     async def async_update(self, item_id, info):
         """Update a check list item."""
-        item = next((itm for itm in self.items if itm["id"] == item_id), None)
+        return await self.async_update_trusted(item_id, ITEM_UPDATE_SCHEMA(info))
+
+    async def async_update_trusted(self, item_id, info):
+        """Update a check list item with info the caller already validated."""
+        item = self._by_id.get(item_id)
 
         if item is None:
             raise KeyError
 
-        info = ITEM_UPDATE_SCHEMA(info)
+        old_name = item["name"]
         item.update(info)
-        await self.hass.async_add_executor_job(self.save)
+        if item["name"] != old_name:
+            # Renames are rare, rebuilding keeps the lookup in list order.
+            self._rebuild_name_index()
+        self._invalidate()
+        self._schedule_save()
         self.hass.bus.async_fire(EVENT, {"action": "update", "item": item})
         return item
 
     async def async_clear_completed(self):
         """Clear completed items."""
-        self.items = [itm for itm in self.items if not itm["complete"]]
-        await self.hass.async_add_executor_job(self.save)
+        if not any(itm["complete"] for itm in self._items):
+            return
+        self._items = [itm for itm in self._items if not itm["complete"]]
+        self._rebuild_index()
+        self._invalidate(reshaped=True)
+        self._schedule_save()
         self.hass.bus.async_fire(
             EVENT, {"action": "clear_completed", "items": self.items}
         )
 
     async def async_list_items(self):
-        await self.hass.async_add_executor_job(self.save)
+        """Send the items to the event bus."""
         self.hass.bus.async_fire(EVENT, {"action": "list_items", "items": self.items})
         return self.items
 
     async def async_update_list(self, info):
         """Update all items in the list."""
-        for item in self.items:
-            item.update(info)
-        await self.hass.async_add_executor_job(self.save)
-        self.hass.bus.async_fire(EVENT, {"action": "update_list", "items": self.items})
+        if len(info) == 1:
+            # The bulk services only ever set one key, assign it directly.
+            ((key, value),) = info.items()
+            for item in self._items:
+                item[key] = value
+        else:
+            for item in self._items:
+                item.update(info)
+        self._invalidate()
+        self._schedule_save()
+        self.hass.bus.async_fire(
+            EVENT, {"action": "update_list", "patch": info, "count": len(self._items)}
+        )
         return self.items
 
-    @callback
-    def async_reorder(self, item_ids):
+    async def async_reorder(self, item_ids):
         """Reorder items."""
-        # The array for sorted items.
-        new_items = []
-        all_items_mapping = {item["id"]: item for item in self.items}
-        # Append items by the order of passed in array.
+        seen = set(item_ids)
+        # Reuse the id index rather than building a mapping per reorder.
+        by_id = self._by_id
+        # Every passed in id must exist, and only once.
+        if len(seen) != len(item_ids) or not seen.issubset(by_id):
+            raise KeyError
+        # The final length is known, so fill a preallocated array.
+        new_items = [None] * len(self._items)
+        idx = 0
+        # Items in the order of the passed in array.
         for item_id in item_ids:
-            if item_id not in all_items_mapping:
-                raise KeyError
-            new_items.append(all_items_mapping[item_id])
-            # Remove the item from mapping after it's appended in the result array.
-            del all_items_mapping[item_id]
+            new_items[idx] = by_id[item_id]
+            idx += 1
         # Append the rest of the items
-        for key in all_items_mapping:
+        for item in self._items:
+            if item["id"] in seen:
+                continue
             # All the unchecked items must be passed in the item_ids array,
-            # so all items left in the mapping should be checked items.
-            if all_items_mapping[key]["complete"] is False:
+            # so all items left over should be checked items.
+            if item["complete"] is False:
                 raise vol.Invalid(
                     "The item ids array doesn't contain all the unchecked check list items."
                 )
-            new_items.append(all_items_mapping[key])
-        self.items = new_items
-        self.hass.async_add_executor_job(self.save)
+            new_items[idx] = item
+            idx += 1
+        self._items = new_items
+        # Reordering keeps the same items, so the id index is still valid.
+        self._rebuild_name_index()
+        self._invalidate(reshaped=True)
+        self._schedule_save()
         self.hass.bus.async_fire(EVENT, {"action": "reorder", "items": self.items})
 
     async def async_load(self):
@@ -296,13 +371,104 @@ class CheckData:
 
         def load():
             """Load the items synchronously."""
-            return load_json(self.hass.config.path(PERSISTENCE), default=[])
+            path = Path(self.hass.config.path(PERSISTENCE))
+            if not path.exists():
+                return []
+            return json_loads(path.read_bytes())
+
+        self._items = await self.hass.async_add_executor_job(load)
+        self._rebuild_index()
+        self._invalidate(reshaped=True)
+
+    def items_json(self):
+        """Return the items serialised as JSON, reusing the last encoding."""
+        if self._json_cache_version != self._version:
+            self._json_cache = json_dumps(self.items)
+            self._json_cache_version = self._version
+        return self._json_cache
+
+    def items_result_frame(self, msg_id):
+        """Return the websocket result message carrying the items."""
+        # Only the message id varies, so keep everything after it around.
+        if self._frame_suffix_version != self._version:
+            items_json = self.items_json().decode()
+            self._frame_suffix = (
+                f',"type":"result","success":true,"result":{items_json}}}'
+            )
+            self._frame_suffix_version = self._version
+        return f'{{"id":{msg_id}{self._frame_suffix}'
+
+    def _invalidate(self, reshaped=False):
+        """Bump the version the caches are keyed on.
+
+        Pass reshaped when items were added, removed or reordered so that the
+        next read of items takes a new tuple.
+        """
+        if reshaped:
+            self._snapshot = None
+        self._version += 1
+
+    def _rebuild_index(self):
+        """Rebuild the id and name lookups from the items list."""
+        self._by_id = {item["id"]: item for item in self._items}
+        self._rebuild_name_index()
+
+    def _rebuild_name_index(self):
+        """Rebuild the name lookup so it follows the items order."""
+        self._by_name = defaultdict(list)
+        for item in self._items:
+            self._by_name[item["name"]].append(item)
 
-        self.items = await self.hass.async_add_executor_job(load)
+    @callback
+    def _schedule_save(self):
+        """Schedule a save, folding in any save that is already pending."""
+        if self._save_handle is not None:
+            return
+        self._save_handle = self.hass.loop.call_later(SAVE_DELAY, self._flush)
 
-    def save(self):
+    @callback
+    def _flush(self):
+        """Queue a write of the items behind any write still running."""
+        self._save_handle = None
+        self._save_task = self.hass.async_create_task(
+            self._async_write(self._save_task)
+        )
+
+    async def _async_write(self, previous):
+        """Write the items in the executor once the previous write is done."""
+        if previous is not None:
+            await previous
+        try:
+            # Take the tuple here in the loop, not in the executor thread.
+            await self.hass.async_add_executor_job(self.save, self.items)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error saving the check list")
+
+    async def async_flush(self, event=None):
+        """Write out a pending save straight away and wait for all writes."""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._flush()
+        if self._save_task is not None:
+            await self._save_task
+
+    def save(self, items):
         """Save the items."""
-        save_json(self.hass.config.path(PERSISTENCE), self.items)
+        path = self.hass.config.path(PERSISTENCE)
+        tmp_path = None
+        # Write the orjson bytes as-is through a unique temporary file.
+        try:
+            with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(path), prefix=f"{PERSISTENCE}.", delete=False
+            ) as fdesc:
+                tmp_path = fdesc.name
+                os.fchmod(fdesc.fileno(), 0o644)
+                fdesc.write(json_dumps(items))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
 
 class CheckListView(http.HomeAssistantView):
@@ -314,7 +480,11 @@ class CheckListView(http.HomeAssistantView):
     @callback
     def get(self, request):
         """Retrieve check list items."""
-        return self.json(request.app["hass"].data[DOMAIN].items)
+        return web.Response(
+            body=request.app["hass"].data[DOMAIN].items_json(),
+            content_type="application/json",
+            headers={"Cache-Control": "no-store"},
+        )
 
 
 class UpdateCheckListItemView(http.HomeAssistantView):
@@ -329,7 +499,6 @@ class UpdateCheckListItemView(http.HomeAssistantView):
 
         try:
             item = await request.app["hass"].data[DOMAIN].async_update(item_id, data)
-            request.app["hass"].bus.async_fire(EVENT)
             return self.json(item)
         except KeyError:
             return self.json_message("Item not found", HTTPStatus.NOT_FOUND)
@@ -349,7 +518,6 @@ class CreateCheckListItemView(http.HomeAssistantView):
         item = (
             await request.app["hass"].data[DOMAIN].async_add(data["name"], data["type"])
         )
-        request.app["hass"].bus.async_fire(EVENT)
         return self.json(item)
 
 
@@ -363,16 +531,13 @@ class ClearCompletedItemsView(http.HomeAssistantView):
         """Retrieve if API is running."""
         hass = request.app["hass"]
         await hass.data[DOMAIN].async_clear_completed()
-        hass.bus.async_fire(EVENT)
         return self.json_message("Cleared completed items.")
 
 
 @callback
 def websocket_handle_items(hass, connection, msg):
     """Handle get check_list items."""
-    connection.send_message(
-        websocket_api.result_message(msg["id"], hass.data[DOMAIN].items)
-    )
+    connection.send_message(hass.data[DOMAIN].items_result_frame(msg["id"]))
 
 
 @websocket_api.async_response
@@ -386,10 +551,9 @@ async def websocket_handle_add(hass, connection, msg):
 @websocket_api.async_response
 async def websocket_handle_update(hass, connection, msg):
     """Handle update check_list item."""
-    msg_id = msg.pop("id")
-    item_id = msg.pop("item_id")
-    msg.pop("type")
-    data = msg
+    msg_id = msg["id"]
+    item_id = msg["item_id"]
+    data = {key: msg[key] for key in (ATTR_NAME, ATTR_COMPLETE) if key in msg}
 
     try:
         item = await hass.data[DOMAIN].async_update(item_id, data)
@@ -415,11 +579,12 @@ async def websocket_handle_clear(hass, connection, msg):
         vol.Required("item_ids"): [str],
     }
 )
-def websocket_handle_reorder(hass, connection, msg):
+@websocket_api.async_response
+async def websocket_handle_reorder(hass, connection, msg):
     """Handle reordering check_list items."""
     msg_id = msg.pop("id")
     try:
-        hass.data[DOMAIN].async_reorder(msg.pop("item_ids"))
+        await hass.data[DOMAIN].async_reorder(msg.pop("item_ids"))
         hass.bus.async_fire(EVENT, {"action": "reorder"})
         connection.send_result(msg_id)
     except KeyError: